@@ -3,16 +3,159 @@ Flask API Server for Fraud Detection System
 Provides REST API endpoints and serves the web frontend
 """
 
-from flask import Flask, request, jsonify, send_from_directory
-from flask_cors import CORS
-from transaction_processor import TransactionProcessor
+from flask import Flask, Response, abort, request, send_from_directory
+from transaction_processor import TransactionProcessor, init_worker
+from itertools import chain
+import multiprocessing
+import orjson
 import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
 
 app = Flask(__name__, static_folder='static', static_url_path='/static')
-# Enable CORS for all routes and origins (for development)
-CORS(app, resources={r"/api/*": {"origins": "*"}})
+# Never pretty-print JSON responses, even when running in debug mode
+app.json.compact = True
 
-processor = TransactionProcessor()
+# Optional file of suspicious CIDR networks, one per line ('#' starts a comment)
+IP_BLOCKLIST = os.environ.get('FRAUD_IP_BLOCKLIST') or None
+
+processor = TransactionProcessor(IP_BLOCKLIST)
+
+
+# CORS headers for the API routes, allowing all origins (for development).
+# Built once here; browsers may cache preflight results for a day. The allowed
+# methods depend on the route, so preflight responses add them separately.
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Headers": "Content-Type",
+    "Access-Control-Max-Age": "86400",
+}
+
+
+# Streamed batch responses are flushed to the client in chunks of about this size
+STREAM_FLUSH_BYTES = 64 * 1024
+
+# Worker processes for large batches, per server process. Under gunicorn every
+# server process gets its own pool, so by default the cores are split between
+# them (gunicorn takes its worker count from WEB_CONCURRENCY when -w is not
+# given). FRAUD_POOL_WORKERS overrides the size; 1 disables the pool.
+POOL_WORKERS = int(os.environ.get('FRAUD_POOL_WORKERS') or 0) or \
+    max(1, (os.cpu_count() or 1) // int(os.environ.get('WEB_CONCURRENCY') or 1))
+# Batches larger than this are split across the worker processes
+PARALLEL_BATCH_THRESHOLD = 256
+# Largest chunk of transactions analyzed in one go
+BATCH_CHUNK_SIZE = 1024
+
+# Worker process pool, created on first use
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Return the shared process pool, creating it lazily"""
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                # spawn rather than fork: the server process already runs threads.
+                # Each worker builds its own processor once, at startup, configured
+                # like the server's processor.
+                _POOL = ProcessPoolExecutor(max_workers=POOL_WORKERS,
+                                            mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=init_worker,
+                                            initargs=processor.worker_initargs())
+    return _POOL
+
+
+def _json_response(payload, status: int = 200):
+    """
+    Build a compact JSON response with orjson
+    
+    Used instead of jsonify for every API response: a single fast serializer,
+    no pretty-printing, and Content-Length taken directly from the encoded bytes.
+    """
+    return app.response_class(orjson.dumps(payload), status=status, mimetype='application/json')
+
+
+def _stream_batch_response(transactions, with_reasoning: bool = False):
+    """
+    Yield the /api/analyze-batch JSON body piece by piece
+    
+    Results are serialized as they come out of the processor and the summary
+    counts are accumulated alongside, then appended after the results array.
+    Errors raised before the first piece is yielded propagate to the caller;
+    later ones are reported in the body.
+    """
+    fraud_threshold = processor.engine.FRAUD_THRESHOLD
+    fraudulent = 0
+    total_risk = 0
+    count = 0
+    buffer = bytearray(b'{"results":[')
+    streaming = False
+    
+    # Analysis is pure Python past the NumPy scoring, so big batches use the worker pool
+    if POOL_WORKERS > 1 and len(transactions) > PARALLEL_BATCH_THRESHOLD:
+        executor = _get_pool()
+        chunk_size = min(BATCH_CHUNK_SIZE, -(-len(transactions) // POOL_WORKERS))
+    else:
+        executor = None
+        chunk_size = BATCH_CHUNK_SIZE
+    
+    try:
+        for r in processor.process_transactions_iter(transactions, chunk_size, with_reasoning, executor,
+                                                     max_pending=2 * POOL_WORKERS):
+            if count:
+                buffer += b','
+            buffer += orjson.dumps(r)
+            count += 1
+            
+            # fraud_status is derived from risk_score, so count with an int comparison
+            risk_score = r["risk_score"]
+            fraudulent += risk_score >= fraud_threshold
+            total_risk += risk_score
+            
+            if len(buffer) >= STREAM_FLUSH_BYTES:
+                streaming = True
+                yield bytes(buffer)
+                buffer.clear()
+    except Exception as e:
+        if not streaming:
+            raise  # Nothing sent yet; the route can still answer with an error status
+        # The status line has already been sent, so report the failure in the body
+        trailer = {"error": "Processing error", "details": str(e)}
+    else:
+        trailer = {
+            "total": count,
+            "fraudulent": fraudulent,
+            "legitimate": count - fraudulent,
+            "average_risk_score": total_risk / count if count else 0
+        }
+    
+    # Close the results array and merge the trailer's fields into the outer object
+    buffer += b'],' + orjson.dumps(trailer)[1:]
+    yield bytes(buffer)
+
+
+@app.before_request
+def cors_preflight():
+    """Answer CORS preflight requests for the API routes without dispatching them"""
+    if request.method == 'OPTIONS' and request.path.startswith('/api/'):
+        rule = request.url_rule
+        # Unknown API paths would otherwise match the static catch-all route
+        if rule is None or not rule.rule.startswith('/api/'):
+            abort(404)
+        
+        response = app.response_class(status=204)
+        response.headers["Access-Control-Allow-Methods"] = ", ".join(sorted(rule.methods - {"HEAD"}))
+        return response
+
+
+@app.after_request
+def add_cors_headers(response):
+    """Attach the precomputed CORS headers to API responses"""
+    if request.path.startswith('/api/'):
+        response.headers.update(CORS_HEADERS)
+    return response
 
 
 @app.route('/')
@@ -36,25 +179,27 @@ def analyze_transaction():
     Analyze a single transaction
     POST /api/analyze
     Body: JSON transaction data
+    Query: ?fast=1 to stop analyzing once the transaction is known to be
+           fraudulent (lowest latency; risk_score and risk_factors may be partial)
     """
     try:
         transaction_data = request.get_json()
         
         if not transaction_data:
-            return jsonify({
+            return _json_response({
                 "error": "No transaction data provided"
-            }), 400
+            }, 400)
         
         # Process transaction
-        result = processor.process_transaction(transaction_data)
+        result = processor.process_transaction(transaction_data, fast=request.args.get('fast') == '1')
         
-        return jsonify(result), 200
+        return _json_response(result)
         
     except Exception as e:
-        return jsonify({
+        return _json_response({
             "error": "Processing error",
             "details": str(e)
-        }), 500
+        }, 500)
 
 
 @app.route('/api/analyze-batch', methods=['POST'])
@@ -63,45 +208,51 @@ def analyze_batch():
     Analyze multiple transactions
     POST /api/analyze-batch
     Body: JSON array of transaction data
+    Query: ?reasoning=1 to include the reasoning text in each result
+    
+    The response is streamed: results are sent as they are analyzed and the
+    summary fields follow the results array. If a transaction fails after
+    streaming has started, "error" and "details" fields replace the summary.
     """
     try:
         transactions = request.get_json()
         
         if not transactions:
-            return jsonify({
+            return _json_response({
                 "error": "No transaction data provided"
-            }), 400
+            }, 400)
         
         if not isinstance(transactions, list):
-            return jsonify({
+            return _json_response({
                 "error": "Expected array of transactions"
-            }), 400
+            }, 400)
         
-        # Process batch
-        results = processor.process_transactions_batch(transactions)
+        if not all(isinstance(t, dict) for t in transactions):
+            return _json_response({
+                "error": "Expected array of transaction objects"
+            }, 400)
         
-        return jsonify({
-            "results": results,
-            "total": len(results),
-            "fraudulent": sum(1 for r in results if r["fraud_status"] == "Fraudulent"),
-            "legitimate": sum(1 for r in results if r["fraud_status"] == "Legitimate"),
-            "average_risk_score": sum(r["risk_score"] for r in results) / len(results) if results else 0
-        }), 200
+        # Process batch, streaming results as they are produced. The first piece
+        # is built before responding, so early failures still get a 500 status.
+        with_reasoning = request.args.get('reasoning') == '1'
+        body = _stream_batch_response(transactions, with_reasoning)
+        first = next(body)
+        return Response(chain((first,), body), mimetype='application/json')
         
     except Exception as e:
-        return jsonify({
+        return _json_response({
             "error": "Processing error",
             "details": str(e)
-        }), 500
+        }, 500)
 
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({
+    return _json_response({
         "status": "healthy",
         "service": "Fraud Detection Engine"
-    }), 200
+    })
 
 
 if __name__ == '__main__':
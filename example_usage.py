@@ -107,7 +107,7 @@ def main():
     print("=" * 80)
     
     transactions_batch = [transaction1, transaction2, transaction3]
-    batch_results = processor.process_transactions_batch(transactions_batch)
+    batch_results = processor.process_transactions_batch(transactions_batch, with_reasoning=True)
     
     # Save results
     processor.save_results(batch_results, "example_results.json")
@@ -3,11 +3,25 @@ Simple API interface for Fraud Detection Engine
 Can be used as a standalone script or imported as a module
 """
 
-import json
+import os
 import sys
+import orjson
 from transaction_processor import TransactionProcessor
 
 
+# Shared processor, created on first use
+_PROCESSOR = None
+
+
+def _get_processor() -> TransactionProcessor:
+    """Return the module-level TransactionProcessor, creating it lazily"""
+    global _PROCESSOR
+    if _PROCESSOR is None:
+        # Same optional IP blocklist setting as the web server
+        _PROCESSOR = TransactionProcessor(os.environ.get('FRAUD_IP_BLOCKLIST') or None)
+    return _PROCESSOR
+
+
 def analyze_single_transaction(transaction_json: str) -> str:
     """
     Analyze a single transaction from JSON string
@@ -18,22 +32,22 @@ def analyze_single_transaction(transaction_json: str) -> str:
     Returns:
         JSON string with fraud detection results
     """
-    processor = TransactionProcessor()
+    processor = _get_processor()
     
     try:
-        transaction_data = json.loads(transaction_json)
+        transaction_data = orjson.loads(transaction_json)
         result = processor.process_transaction(transaction_data)
-        return json.dumps(result, indent=2)
-    except json.JSONDecodeError as e:
-        return json.dumps({
+        return processor.format_output(result)
+    except orjson.JSONDecodeError as e:
+        return processor.format_output({
             "error": "Invalid JSON format",
             "details": str(e)
-        }, indent=2)
+        })
     except Exception as e:
-        return json.dumps({
+        return processor.format_output({
             "error": "Processing error",
             "details": str(e)
-        }, indent=2)
+        })
 
 
 def analyze_from_file(input_file: str, output_file: str = None):
@@ -44,15 +58,15 @@ def analyze_from_file(input_file: str, output_file: str = None):
         input_file: Path to input JSON file (single transaction or array)
         output_file: Optional path to save results
     """
-    processor = TransactionProcessor()
+    processor = _get_processor()
     
     try:
-        with open(input_file, 'r') as f:
-            data = json.load(f)
+        with open(input_file, 'rb') as f:
+            data = orjson.loads(f.read())
         
         # Handle both single transaction and array of transactions
         if isinstance(data, list):
-            results = processor.process_transactions_batch(data)
+            results = processor.process_transactions_batch(data, with_reasoning=True)
         else:
             results = [processor.process_transaction(data)]
         
@@ -69,7 +83,7 @@ def analyze_from_file(input_file: str, output_file: str = None):
     except FileNotFoundError:
         print(f"Error: File '{input_file}' not found")
         return None
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         print(f"Error: Invalid JSON in file - {e}")
         return None
     except Exception as e:
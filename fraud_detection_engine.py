@@ -4,14 +4,21 @@ Analyzes financial transactions and identifies potentially fraudulent activities
 """
 
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass
+from typing import Collection, Dict, List, Optional, Tuple
+from dataclasses import dataclass, field
+from functools import lru_cache
 import json
+import re
+import sys
 
+import numpy as np
 
-@dataclass
+from ip_reputation import IPReputationTable
+
+
+@dataclass(slots=True)
 class Transaction:
-    """Transaction data model"""
+    """Transaction data model (slotted to keep per-record memory small)"""
     transaction_id: str
     user_id: str
     amount: float
@@ -27,16 +34,189 @@ class Transaction:
     transaction_frequency_24h: int
     avg_user_transaction_amount: float
     # Optional fields for context
-    user_device_history: Optional[List[str]] = None
-    user_location_history: Optional[List[str]] = None
-    user_ip_history: Optional[List[str]] = None
+    user_device_history: Optional[Collection[str]] = None
+    user_location_history: Optional[Collection[str]] = None
+    user_ip_history: Optional[Collection[str]] = None
     user_international_history: Optional[bool] = None
+    # Lowercased copies used by the analyzers, derived once at construction
+    merchant_category_lc: str = field(init=False, repr=False, compare=False)
+    payment_method_lc: str = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        self.merchant_category_lc = self.merchant_category.lower()
+        self.payment_method_lc = self.payment_method.lower()
+
+
+# Location and timestamp strings repeat heavily across a user's transactions,
+# so these pure string helpers are memoized at module level.
+
+@lru_cache(maxsize=8192)
+def _extract_country(location: str) -> Optional[str]:
+    """Extract country from location string (simplified; callers check for str first)"""
+    if not location:
+        return None
+    
+    # Simple extraction - in production, use proper geocoding
+    parts = location.split(',')
+    if len(parts) > 0:
+        return parts[-1].strip()
+    return location.strip()
+
+
+if sys.version_info >= (3, 11):
+    # Accepts a trailing 'Z' natively, so no intermediate string is needed
+    _fromisoformat = datetime.fromisoformat
+else:
+    def _fromisoformat(value: str) -> datetime:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+@lru_cache(maxsize=16384)
+def _parse_hour(transaction_time: str) -> Optional[int]:
+    """Extract the hour from an ISO timestamp, None if it cannot be parsed (callers check for str first)"""
+    try:
+        return _fromisoformat(transaction_time).hour
+    except:
+        return None  # If time parsing fails, skip this analysis
+
+
+def _is_new(value, history) -> bool:
+    """True if there is a history and value is not in it"""
+    if not history:
+        return False
+    try:
+        return value not in history
+    except TypeError:
+        return True  # Unhashable value; it cannot be in a frozenset history
+
+
+# Levels of the rules with several outcomes. The analyzers and the batch
+# scorer assign one per rule; it selects the rule's weight and message.
+AMOUNT_NORMAL, AMOUNT_SPIKE, AMOUNT_ABOVE_AVERAGE, AMOUNT_UNUSUALLY_SMALL, AMOUNT_HIGH_VALUE_FIRST = range(5)
+FREQUENCY_NORMAL, FREQUENCY_ABNORMAL, FREQUENCY_ELEVATED = range(3)
+DOMESTIC, INTERNATIONAL_WITHOUT_HISTORY, INTERNATIONAL_HISTORY_UNKNOWN, INTERNATIONAL_WITH_HISTORY = range(4)
+DEVICE_KNOWN, DEVICE_NEW, DEVICE_NO_HISTORY = range(3)
+IP_KNOWN, IP_NEW, IP_NO_HISTORY = range(3)
+PAYMENT_NORMAL, PAYMENT_HIGH_VALUE_WALLET, PAYMENT_SMALL_NET_BANKING = range(3)
+
+# Risk weights shared by the scalar analyzers and the batch scorer,
+# indexed by the levels above
+AMOUNT_RISK = (0, 25, 15, 5, 10)
+FREQUENCY_RISK = (0, 20, 10)
+INTERNATIONAL_RISK = (0, 30, 20, 5)
+DEVICE_RISK = (0, 12, 3)
+IP_RISK = (0, 10, 2)
+PAYMENT_RISK = (0, 5, 3)
+NEW_LOCATION_RISK = 15
+SUSPICIOUS_IP_RISK = 15
+HIGH_RISK_MERCHANT_RISK = 10
+LOW_RISK_MERCHANT_CREDIT = 5  # Subtracted; the merchant component never goes below 0
+OFF_PEAK_RISK = 5
+MAX_RISK_SCORE = 100
+
+# Fixed rule boundaries
+SMALL_AMOUNT_RATIO = 0.1  # Below 0.1x the user average = possible test transaction
+FIRST_TRANSACTION_HIGH_VALUE = 1000
+WALLET_HIGH_VALUE = 5000
+NET_BANKING_SMALL_VALUE = 100
+OFF_PEAK_START_HOUR = 2
+OFF_PEAK_END_HOUR = 5
+
+# Payment methods with dedicated rules, encoded for the batch scorer
+PAYMENT_CODE_OTHER, PAYMENT_CODE_WALLET, PAYMENT_CODE_NET_BANKING = range(3)
+
+# Range of the int64 columns used by the batch scorer
+_INT64_MIN = int(np.iinfo(np.int64).min)
+_INT64_MAX = int(np.iinfo(np.int64).max)
+
+
+def _score_columns(amounts, avgs, freq, hours, international, international_history_level, new_location,
+                   has_device_history, new_device, has_ip_history, new_ip, suspicious_ip,
+                   payment_codes, high_risk_merchant, low_risk_merchant,
+                   high_amount_multiplier, medium_amount_multiplier,
+                   high_frequency_threshold, medium_frequency_threshold):
+    """
+    Score a batch of transactions held as NumPy columns
+    
+    Returns:
+        Tuple of (amount_level, ratios, frequency_level, international_level,
+        payment_level, risk_scores) arrays; the levels index the *_RISK tables
+        and let the caller rebuild the matching risk factor strings
+    """
+    # 1. Amount
+    has_avg = avgs > 0
+    ratios = amounts / np.where(has_avg, avgs, 1.0)
+    amount_level = np.where(
+        has_avg,
+        np.where(ratios >= high_amount_multiplier, AMOUNT_SPIKE,
+                 np.where(ratios >= medium_amount_multiplier, AMOUNT_ABOVE_AVERAGE,
+                          np.where(ratios < SMALL_AMOUNT_RATIO, AMOUNT_UNUSUALLY_SMALL, AMOUNT_NORMAL))),
+        np.where(amounts > FIRST_TRANSACTION_HIGH_VALUE, AMOUNT_HIGH_VALUE_FIRST, AMOUNT_NORMAL)
+    )
+    
+    # 2. Frequency
+    frequency_level = np.where(freq >= high_frequency_threshold, FREQUENCY_ABNORMAL,
+                               np.where(freq >= medium_frequency_threshold, FREQUENCY_ELEVATED, FREQUENCY_NORMAL))
+    
+    # 3. Location (international_history_level is the level an international transaction gets)
+    international_level = np.where(international, international_history_level, DOMESTIC)
+    location_risk = np.take(INTERNATIONAL_RISK, international_level) + np.where(new_location, NEW_LOCATION_RISK, 0)
+    
+    # 4. Device
+    device_level = np.where(has_device_history, np.where(new_device, DEVICE_NEW, DEVICE_KNOWN), DEVICE_NO_HISTORY)
+    
+    # 5. IP Address
+    ip_level = np.where(has_ip_history, np.where(new_ip, IP_NEW, IP_KNOWN), IP_NO_HISTORY)
+    ip_risk = np.take(IP_RISK, ip_level) + np.where(suspicious_ip, SUSPICIOUS_IP_RISK, 0)
+    
+    # 6. Payment Method
+    high_value_wallet = (payment_codes == PAYMENT_CODE_WALLET) & (amounts > WALLET_HIGH_VALUE)
+    small_net_banking = (payment_codes == PAYMENT_CODE_NET_BANKING) & (amounts < NET_BANKING_SMALL_VALUE)
+    payment_level = np.where(high_value_wallet, PAYMENT_HIGH_VALUE_WALLET,
+                             np.where(small_net_banking, PAYMENT_SMALL_NET_BANKING, PAYMENT_NORMAL))
+    
+    # 7. Merchant (never negative)
+    merchant_risk = np.maximum(0, np.where(high_risk_merchant, HIGH_RISK_MERCHANT_RISK, 0)
+                               - np.where(low_risk_merchant, LOW_RISK_MERCHANT_CREDIT, 0))
+    
+    # 8. Time Pattern
+    time_risk = np.where((hours >= OFF_PEAK_START_HOUR) & (hours <= OFF_PEAK_END_HOUR), OFF_PEAK_RISK, 0)
+    
+    # Cap risk score at 100
+    risk_scores = np.minimum(MAX_RISK_SCORE,
+                             np.take(AMOUNT_RISK, amount_level) + np.take(FREQUENCY_RISK, frequency_level)
+                             + location_risk + np.take(DEVICE_RISK, device_level) + ip_risk
+                             + np.take(PAYMENT_RISK, payment_level) + merchant_risk + time_risk)
+    
+    return amount_level, ratios, frequency_level, international_level, payment_level, risk_scores
 
 
 class FraudDetectionEngine:
     """Main fraud detection engine with risk scoring and pattern analysis"""
     
-    def __init__(self):
+    # Known merchant categories with higher / lower risk. High-risk categories
+    # match as substrings ("online gambling"), so they are compiled into one regex.
+    _HIGH_RISK_CATEGORIES = frozenset({"gambling", "cryptocurrency", "adult", "cash advance"})
+    _HIGH_RISK_CATEGORY_RE = re.compile("|".join(map(re.escape, sorted(_HIGH_RISK_CATEGORIES))))
+    _LOW_RISK_CATEGORIES = frozenset({"retail", "groceries", "restaurant", "utilities"})
+    # Payment methods with dedicated rules, encoded for the vectorized batch path
+    _PAYMENT_CODES = {"wallet": PAYMENT_CODE_WALLET, "net banking": PAYMENT_CODE_NET_BANKING}
+    # Recommended actions
+    _BLOCK = "Block transaction immediately"
+    _REVIEW = "Flag for review"
+    _ALLOW = "Allow transaction"
+    # Threshold attributes set in __init__; copied when configuring another engine the same way
+    THRESHOLD_SETTINGS = ("HIGH_AMOUNT_MULTIPLIER", "MEDIUM_AMOUNT_MULTIPLIER", "HIGH_FREQUENCY_THRESHOLD",
+                          "MEDIUM_FREQUENCY_THRESHOLD", "FRAUD_THRESHOLD", "REVIEW_THRESHOLD")
+    
+    def __init__(self, ip_blocklist: Optional[str] = None):
+        """
+        Args:
+            ip_blocklist: Optional path to a file of suspicious CIDR networks, one per line
+        """
+        # IP reputation lookups (private ranges are always treated as legitimate)
+        self.ip_reputation = IPReputationTable.from_file(ip_blocklist) if ip_blocklist else IPReputationTable()
+        
         # Risk thresholds
         self.HIGH_AMOUNT_MULTIPLIER = 3.0  # 3x average = high risk
         self.MEDIUM_AMOUNT_MULTIPLIER = 2.0  # 2x average = medium risk
@@ -45,269 +225,402 @@ class FraudDetectionEngine:
         self.FRAUD_THRESHOLD = 70  # Risk score >= 70 = Fraudulent
         self.REVIEW_THRESHOLD = 40  # Risk score >= 40 = Flag for review
         
-    def analyze_transaction(self, transaction: Transaction) -> Dict:
+    def analyze_transaction(self, transaction: Transaction, with_reasoning: bool = True, fast: bool = False) -> Dict:
         """
         Main analysis function that processes a transaction and returns fraud assessment
         
         Args:
             transaction: Transaction object with all relevant data
+            with_reasoning: Include the human-readable reasoning text in the result
+            fast: Stop as soon as the score reaches FRAUD_THRESHOLD. The verdict is
+                the same (no analyzer lowers the score), but risk_score and
+                risk_factors only cover the analyzers that ran
             
         Returns:
-            Dictionary with fraud_status, risk_score, risk_factors, reasoning, and recommended_action
+            Dictionary with fraud_status, risk_score, risk_factors, reasoning (if requested),
+            and recommended_action
         """
         risk_factors = []
         risk_score = 0
         
-        # 1. Amount Analysis
-        amount_risk, amount_factors = self._analyze_amount(transaction)
-        risk_score += amount_risk
-        risk_factors.extend(amount_factors)
-        
-        # 2. Frequency Analysis
-        frequency_risk, frequency_factors = self._analyze_frequency(transaction)
-        risk_score += frequency_risk
-        risk_factors.extend(frequency_factors)
-        
-        # 3. Location Analysis
-        location_risk, location_factors = self._analyze_location(transaction)
-        risk_score += location_risk
-        risk_factors.extend(location_factors)
-        
-        # 4. Device Analysis
-        device_risk, device_factors = self._analyze_device(transaction)
-        risk_score += device_risk
-        risk_factors.extend(device_factors)
-        
-        # 5. IP Address Analysis
-        ip_risk, ip_factors = self._analyze_ip(transaction)
-        risk_score += ip_risk
-        risk_factors.extend(ip_factors)
-        
-        # 6. Payment Method Analysis
-        payment_risk, payment_factors = self._analyze_payment_method(transaction)
-        risk_score += payment_risk
-        risk_factors.extend(payment_factors)
-        
-        # 7. Merchant Analysis
-        merchant_risk, merchant_factors = self._analyze_merchant(transaction)
-        risk_score += merchant_risk
-        risk_factors.extend(merchant_factors)
-        
-        # 8. Time Pattern Analysis
-        time_risk, time_factors = self._analyze_time_pattern(transaction)
-        risk_score += time_risk
-        risk_factors.extend(time_factors)
+        analyzers = (
+            self._analyze_amount,          # 1. Amount Analysis
+            self._analyze_frequency,       # 2. Frequency Analysis
+            self._analyze_location,        # 3. Location Analysis
+            self._analyze_device,          # 4. Device Analysis
+            self._analyze_ip,              # 5. IP Address Analysis
+            self._analyze_payment_method,  # 6. Payment Method Analysis
+            self._analyze_merchant,        # 7. Merchant Analysis
+            self._analyze_time_pattern     # 8. Time Pattern Analysis
+        )
+        
+        for analyze in analyzers:
+            risk, factors = analyze(transaction)
+            risk_score += risk
+            risk_factors.extend(factors)
+            
+            # Already fraudulent; the remaining analyzers cannot change the verdict
+            if fast and risk_score >= self.FRAUD_THRESHOLD:
+                break
         
         # Cap risk score at 100
-        risk_score = min(100, risk_score)
+        risk_score = min(MAX_RISK_SCORE, risk_score)
         
         # Determine fraud status
         fraud_status = "Fraudulent" if risk_score >= self.FRAUD_THRESHOLD else "Legitimate"
         
-        # Generate reasoning
-        reasoning = self._generate_reasoning(risk_factors, risk_score, transaction)
-        
-        # Recommend action
-        recommended_action = self._recommend_action(risk_score)
-        
-        return {
+        result = {
             "transaction_id": transaction.transaction_id,
             "fraud_status": fraud_status,
             "risk_score": risk_score,
-            "risk_factors": risk_factors,
-            "reasoning": reasoning,
-            "recommended_action": recommended_action
+            "risk_factors": risk_factors
         }
+        
+        # Generate reasoning (skipped when the caller only needs the verdict)
+        if with_reasoning:
+            result["reasoning"] = self._generate_reasoning(risk_factors, risk_score, transaction)
+        
+        # Recommend action
+        result["recommended_action"] = self._recommend_action(risk_score)
+        
+        return result
+
+    def analyze_batch(self, transactions: List[Transaction], with_reasoning: bool = True) -> List[Dict]:
+        """
+        Vectorized analysis of many transactions at once
+        
+        Gathers the scoring inputs into NumPy columns and scores them in one
+        pass; results match analyze_transaction. Only the scoring is vectorized:
+        gathering the inputs and building the risk factor strings still run per
+        transaction, so the gain over a loop of analyze_transaction calls is modest.
+        
+        Args:
+            transactions: List of Transaction objects
+            with_reasoning: Include the human-readable reasoning text in each result
+            
+        Returns:
+            List of dictionaries in the same format as analyze_transaction
+        """
+        if not transactions:
+            return []
+        
+        # Gather the columns; history membership and string checks stay in Python
+        amounts, avgs, freq, hours = [], [], [], []
+        user_countries, merchant_countries = [], []
+        international, international_history_level = [], []
+        new_location, has_device_history, new_device = [], [], []
+        has_ip_history, new_ip, suspicious_ip = [], [], []
+        payment_codes, high_risk_merchant, low_risk_merchant = [], [], []
+        
+        for t in transactions:
+            amounts.append(t.amount)
+            avgs.append(t.avg_user_transaction_amount)
+            # Clamped so out-of-range counts still fit the int64 column; the rule only compares them
+            freq.append(min(max(t.transaction_frequency_24h, _INT64_MIN), _INT64_MAX))
+            hour = _parse_hour(t.transaction_time) if isinstance(t.transaction_time, str) else None
+            hours.append(-1 if hour is None else hour)
+            
+            user_country = _extract_country(t.user_location) if isinstance(t.user_location, str) else None
+            merchant_country = _extract_country(t.merchant_location) if isinstance(t.merchant_location, str) else None
+            user_countries.append(user_country)
+            merchant_countries.append(merchant_country)
+            international.append(bool(user_country and merchant_country and user_country != merchant_country))
+            if t.user_international_history is False:
+                international_history_level.append(INTERNATIONAL_WITHOUT_HISTORY)
+            elif t.user_international_history is None:
+                international_history_level.append(INTERNATIONAL_HISTORY_UNKNOWN)
+            else:
+                international_history_level.append(INTERNATIONAL_WITH_HISTORY)
+            
+            new_location.append(_is_new(t.user_location, t.user_location_history))
+            has_device_history.append(bool(t.user_device_history))
+            new_device.append(_is_new(t.device_type, t.user_device_history))
+            has_ip_history.append(bool(t.user_ip_history))
+            new_ip.append(_is_new(t.ip_address, t.user_ip_history))
+            suspicious_ip.append(self._is_suspicious_ip(t.ip_address))
+            
+            payment_codes.append(self._PAYMENT_CODES.get(t.payment_method_lc, PAYMENT_CODE_OTHER))
+            high_risk_merchant.append(self._HIGH_RISK_CATEGORY_RE.search(t.merchant_category_lc) is not None)
+            low_risk_merchant.append(t.merchant_category_lc in self._LOW_RISK_CATEGORIES)
+        
+        # Score every component over the columns at once
+        amount_levels, ratios, frequency_levels, international_levels, payment_levels, risk_scores = _score_columns(
+            np.array(amounts, dtype=np.float64),
+            np.array(avgs, dtype=np.float64),
+            np.array(freq, dtype=np.int64),
+            np.array(hours, dtype=np.int64),
+            np.array(international, dtype=np.bool_),
+            np.array(international_history_level, dtype=np.int64),
+            np.array(new_location, dtype=np.bool_),
+            np.array(has_device_history, dtype=np.bool_),
+            np.array(new_device, dtype=np.bool_),
+            np.array(has_ip_history, dtype=np.bool_),
+            np.array(new_ip, dtype=np.bool_),
+            np.array(suspicious_ip, dtype=np.bool_),
+            np.array(payment_codes, dtype=np.int64),
+            np.array(high_risk_merchant, dtype=np.bool_),
+            np.array(low_risk_merchant, dtype=np.bool_),
+            self.HIGH_AMOUNT_MULTIPLIER,
+            self.MEDIUM_AMOUNT_MULTIPLIER,
+            self.HIGH_FREQUENCY_THRESHOLD,
+            self.MEDIUM_FREQUENCY_THRESHOLD
+        )
+        
+        amount_levels = amount_levels.tolist()
+        ratios = ratios.tolist()
+        frequency_levels = frequency_levels.tolist()
+        international_levels = international_levels.tolist()
+        payment_levels = payment_levels.tolist()
+        risk_scores = risk_scores.tolist()
+        
+        results = []
+        for i, t in enumerate(transactions):
+            # Factor strings are only built here, in the same order as analyze_transaction
+            risk_factors = []
+            self._amount_factors(risk_factors, amount_levels[i], ratios[i], t)
+            self._frequency_factors(risk_factors, frequency_levels[i], t)
+            self._location_factors(risk_factors, international_levels[i], new_location[i],
+                                   user_countries[i], merchant_countries[i], t)
+            self._device_factors(risk_factors, has_device_history[i], new_device[i], t)
+            self._ip_factors(risk_factors, new_ip[i], suspicious_ip[i], t)
+            self._payment_factors(risk_factors, payment_levels[i])
+            self._merchant_factors(risk_factors, high_risk_merchant[i], low_risk_merchant[i], t)
+            if OFF_PEAK_START_HOUR <= hours[i] <= OFF_PEAK_END_HOUR:
+                self._time_factors(risk_factors, hours[i])
+            
+            risk_score = risk_scores[i]
+            result = {
+                "transaction_id": t.transaction_id,
+                "fraud_status": "Fraudulent" if risk_score >= self.FRAUD_THRESHOLD else "Legitimate",
+                "risk_score": risk_score,
+                "risk_factors": risk_factors
+            }
+            if with_reasoning:
+                result["reasoning"] = self._generate_reasoning(risk_factors, risk_score, t)
+            result["recommended_action"] = self._recommend_action(risk_score)
+            results.append(result)
+        
+        return results
     
     def _analyze_amount(self, transaction: Transaction) -> Tuple[int, List[str]]:
         """Analyze transaction amount against user's average"""
-        risk_score = 0
-        factors = []
+        level = AMOUNT_NORMAL
+        ratio = 0.0
         
         if transaction.avg_user_transaction_amount > 0:
             ratio = transaction.amount / transaction.avg_user_transaction_amount
             
             if ratio >= self.HIGH_AMOUNT_MULTIPLIER:
-                risk_score += 25
-                factors.append(f"Amount spike: {ratio:.2f}x user average (${transaction.amount:.2f} vs ${transaction.avg_user_transaction_amount:.2f})")
+                level = AMOUNT_SPIKE
             elif ratio >= self.MEDIUM_AMOUNT_MULTIPLIER:
-                risk_score += 15
-                factors.append(f"Above-average amount: {ratio:.2f}x user average")
-            elif ratio < 0.1:
-                risk_score += 5
-                factors.append(f"Unusually small amount: {ratio:.2f}x user average (possible test transaction)")
+                level = AMOUNT_ABOVE_AVERAGE
+            elif ratio < SMALL_AMOUNT_RATIO:
+                level = AMOUNT_UNUSUALLY_SMALL
         else:
             # First transaction or no history
-            if transaction.amount > 1000:
-                risk_score += 10
-                factors.append("High-value first transaction without user history")
+            if transaction.amount > FIRST_TRANSACTION_HIGH_VALUE:
+                level = AMOUNT_HIGH_VALUE_FIRST
         
-        return risk_score, factors
+        factors = []
+        self._amount_factors(factors, level, ratio, transaction)
+        return AMOUNT_RISK[level], factors
     
     def _analyze_frequency(self, transaction: Transaction) -> Tuple[int, List[str]]:
         """Analyze transaction frequency in last 24 hours"""
-        risk_score = 0
-        factors = []
+        level = FREQUENCY_NORMAL
         
         if transaction.transaction_frequency_24h >= self.HIGH_FREQUENCY_THRESHOLD:
-            risk_score += 20
-            factors.append(f"Abnormal frequency: {transaction.transaction_frequency_24h} transactions in last 24 hours")
+            level = FREQUENCY_ABNORMAL
         elif transaction.transaction_frequency_24h >= self.MEDIUM_FREQUENCY_THRESHOLD:
-            risk_score += 10
-            factors.append(f"Elevated frequency: {transaction.transaction_frequency_24h} transactions in last 24 hours")
+            level = FREQUENCY_ELEVATED
         elif transaction.transaction_frequency_24h == 0:
             # First transaction in 24h - could be normal or suspicious if combined with other factors
             pass
         
-        return risk_score, factors
+        factors = []
+        self._frequency_factors(factors, level, transaction)
+        return FREQUENCY_RISK[level], factors
     
     def _analyze_location(self, transaction: Transaction) -> Tuple[int, List[str]]:
         """Analyze location patterns and mismatches"""
-        risk_score = 0
-        factors = []
+        international_level = DOMESTIC
         
         # Check if user and merchant locations match
-        user_country = self._extract_country(transaction.user_location)
-        merchant_country = self._extract_country(transaction.merchant_location)
+        # Non-string locations have no country; the cache would fail to hash them
+        user_location, merchant_location = transaction.user_location, transaction.merchant_location
+        user_country = _extract_country(user_location) if isinstance(user_location, str) else None
+        merchant_country = _extract_country(merchant_location) if isinstance(merchant_location, str) else None
         
         if user_country and merchant_country:
             if user_country != merchant_country:
                 # International transaction
                 if transaction.user_international_history is False:
-                    risk_score += 30
-                    factors.append(f"International transaction without history: {user_country} → {merchant_country}")
+                    international_level = INTERNATIONAL_WITHOUT_HISTORY
                 elif transaction.user_international_history is None:
-                    risk_score += 20
-                    factors.append(f"International transaction: {user_country} → {merchant_country} (no history available)")
+                    international_level = INTERNATIONAL_HISTORY_UNKNOWN
                 else:
-                    risk_score += 5
-                    factors.append(f"International transaction: {user_country} → {merchant_country}")
+                    international_level = INTERNATIONAL_WITH_HISTORY
         
         # Check location history
-        if transaction.user_location_history:
-            if transaction.user_location not in transaction.user_location_history:
-                risk_score += 15
-                factors.append(f"New location detected: {transaction.user_location}")
+        new_location = _is_new(transaction.user_location, transaction.user_location_history)
         
-        return risk_score, factors
+        factors = []
+        self._location_factors(factors, international_level, new_location, user_country, merchant_country, transaction)
+        return INTERNATIONAL_RISK[international_level] + (NEW_LOCATION_RISK if new_location else 0), factors
     
     def _analyze_device(self, transaction: Transaction) -> Tuple[int, List[str]]:
         """Analyze device type and device history"""
-        risk_score = 0
-        factors = []
-        
-        if transaction.user_device_history:
-            # Check if device is new
-            if transaction.device_type not in transaction.user_device_history:
-                risk_score += 12
-                factors.append(f"New device type detected: {transaction.device_type}")
+        has_history = bool(transaction.user_device_history)
+        # Check if device is new
+        new_device = _is_new(transaction.device_type, transaction.user_device_history)
+        
+        if not has_history:
+            level = DEVICE_NO_HISTORY  # First transaction or new user
+        elif new_device:
+            level = DEVICE_NEW
         else:
-            # No device history - first transaction or new user
-            risk_score += 3
-            factors.append("No device history available")
+            level = DEVICE_KNOWN
         
-        return risk_score, factors
+        factors = []
+        self._device_factors(factors, has_history, new_device, transaction)
+        return DEVICE_RISK[level], factors
     
     def _analyze_ip(self, transaction: Transaction) -> Tuple[int, List[str]]:
         """Analyze IP address patterns"""
-        risk_score = 0
-        factors = []
-        
-        if transaction.user_ip_history:
-            if transaction.ip_address not in transaction.user_ip_history:
-                risk_score += 10
-                factors.append(f"New IP address detected: {transaction.ip_address}")
-        else:
-            # No IP history
-            risk_score += 2
+        has_history = bool(transaction.user_ip_history)
+        new_ip = _is_new(transaction.ip_address, transaction.user_ip_history)
         
         # Check for suspicious IP patterns (simplified - in production, use IP reputation services)
-        if self._is_suspicious_ip(transaction.ip_address):
-            risk_score += 15
-            factors.append(f"Suspicious IP address pattern detected: {transaction.ip_address}")
+        suspicious = self._is_suspicious_ip(transaction.ip_address)
+        
+        if not has_history:
+            level = IP_NO_HISTORY
+        elif new_ip:
+            level = IP_NEW
+        else:
+            level = IP_KNOWN
         
-        return risk_score, factors
+        factors = []
+        self._ip_factors(factors, new_ip, suspicious, transaction)
+        return IP_RISK[level] + (SUSPICIOUS_IP_RISK if suspicious else 0), factors
     
     def _analyze_payment_method(self, transaction: Transaction) -> Tuple[int, List[str]]:
         """Analyze payment method for risk patterns"""
-        risk_score = 0
-        factors = []
+        level = PAYMENT_NORMAL
         
         # Wallet and UPI are generally lower risk for small amounts
         # Card and Net Banking might have different risk profiles
-        payment_method = transaction.payment_method.lower()
+        payment_method = transaction.payment_method_lc
         
-        if payment_method == "wallet" and transaction.amount > 5000:
-            risk_score += 5
-            factors.append("High-value wallet transaction")
-        elif payment_method == "net banking" and transaction.amount < 100:
-            risk_score += 3
-            factors.append("Unusually small net banking transaction")
+        if payment_method == "wallet" and transaction.amount > WALLET_HIGH_VALUE:
+            level = PAYMENT_HIGH_VALUE_WALLET
+        elif payment_method == "net banking" and transaction.amount < NET_BANKING_SMALL_VALUE:
+            level = PAYMENT_SMALL_NET_BANKING
         
-        return risk_score, factors
+        factors = []
+        self._payment_factors(factors, level)
+        return PAYMENT_RISK[level], factors
     
     def _analyze_merchant(self, transaction: Transaction) -> Tuple[int, List[str]]:
         """Analyze merchant information"""
         risk_score = 0
-        factors = []
         
-        # Known merchant categories with higher risk
-        high_risk_categories = ["gambling", "cryptocurrency", "adult", "cash advance"]
-        merchant_category_lower = transaction.merchant_category.lower()
-        
-        if any(category in merchant_category_lower for category in high_risk_categories):
-            risk_score += 10
-            factors.append(f"High-risk merchant category: {transaction.merchant_category}")
+        high_risk = self._HIGH_RISK_CATEGORY_RE.search(transaction.merchant_category_lc) is not None
+        if high_risk:
+            risk_score += HIGH_RISK_MERCHANT_RISK
         
         # If merchant is known and category is normal, reduce risk slightly
-        if merchant_category_lower in ["retail", "groceries", "restaurant", "utilities"]:
-            risk_score -= 5
-            factors.append(f"Known low-risk merchant category: {transaction.merchant_category}")
+        low_risk = transaction.merchant_category_lc in self._LOW_RISK_CATEGORIES
+        if low_risk:
+            risk_score -= LOW_RISK_MERCHANT_CREDIT
         
+        factors = []
+        self._merchant_factors(factors, high_risk, low_risk, transaction)
         return max(0, risk_score), factors  # Don't allow negative risk
     
     def _analyze_time_pattern(self, transaction: Transaction) -> Tuple[int, List[str]]:
         """Analyze transaction time patterns"""
-        risk_score = 0
-        factors = []
+        # Other types are skipped up front: the cache would fail to hash them
+        transaction_time = transaction.transaction_time
+        hour = _parse_hour(transaction_time) if isinstance(transaction_time, str) else None
         
-        try:
-            trans_time = datetime.fromisoformat(transaction.transaction_time.replace('Z', '+00:00'))
-            hour = trans_time.hour
-            
-            # Transactions between 2 AM and 5 AM are slightly more suspicious
-            if 2 <= hour <= 5:
-                risk_score += 5
-                factors.append(f"Unusual transaction time: {hour:02d}:00 (off-peak hours)")
-        except:
-            pass  # If time parsing fails, skip this analysis
-        
-        return risk_score, factors
-    
-    def _extract_country(self, location: str) -> Optional[str]:
-        """Extract country from location string (simplified)"""
-        if not location:
-            return None
-        
-        # Simple extraction - in production, use proper geocoding
-        parts = location.split(',')
-        if len(parts) > 0:
-            return parts[-1].strip()
-        return location.strip()
+        # Transactions between 2 AM and 5 AM are slightly more suspicious
+        if hour is not None and OFF_PEAK_START_HOUR <= hour <= OFF_PEAK_END_HOUR:
+            factors = []
+            self._time_factors(factors, hour)
+            return OFF_PEAK_RISK, factors
+        
+        return 0, []
+    
+    # Risk factor messages, shared by the analyzers above and analyze_batch.
+    # Each appends the messages for the rule outcome it is given.
+    
+    def _amount_factors(self, factors: List[str], level: int, ratio: float, transaction: Transaction):
+        """Amount messages for an AMOUNT_* level"""
+        if level == AMOUNT_SPIKE:
+            factors.append(f"Amount spike: {ratio:.2f}x user average (${transaction.amount:.2f} vs ${transaction.avg_user_transaction_amount:.2f})")
+        elif level == AMOUNT_ABOVE_AVERAGE:
+            factors.append(f"Above-average amount: {ratio:.2f}x user average")
+        elif level == AMOUNT_UNUSUALLY_SMALL:
+            factors.append(f"Unusually small amount: {ratio:.2f}x user average (possible test transaction)")
+        elif level == AMOUNT_HIGH_VALUE_FIRST:
+            factors.append("High-value first transaction without user history")
+    
+    def _frequency_factors(self, factors: List[str], level: int, transaction: Transaction):
+        """Frequency messages for a FREQUENCY_* level"""
+        if level == FREQUENCY_ABNORMAL:
+            factors.append(f"Abnormal frequency: {transaction.transaction_frequency_24h} transactions in last 24 hours")
+        elif level == FREQUENCY_ELEVATED:
+            factors.append(f"Elevated frequency: {transaction.transaction_frequency_24h} transactions in last 24 hours")
+    
+    def _location_factors(self, factors: List[str], international_level: int, new_location: bool,
+                          user_country: Optional[str], merchant_country: Optional[str], transaction: Transaction):
+        """Location messages for an international level and the new-location check"""
+        if international_level == INTERNATIONAL_WITHOUT_HISTORY:
+            factors.append(f"International transaction without history: {user_country} → {merchant_country}")
+        elif international_level == INTERNATIONAL_HISTORY_UNKNOWN:
+            factors.append(f"International transaction: {user_country} → {merchant_country} (no history available)")
+        elif international_level == INTERNATIONAL_WITH_HISTORY:
+            factors.append(f"International transaction: {user_country} → {merchant_country}")
+        if new_location:
+            factors.append(f"New location detected: {transaction.user_location}")
+    
+    def _device_factors(self, factors: List[str], has_history: bool, new_device: bool, transaction: Transaction):
+        """Device messages"""
+        if new_device:
+            factors.append(f"New device type detected: {transaction.device_type}")
+        elif not has_history:
+            factors.append("No device history available")
+    
+    def _ip_factors(self, factors: List[str], new_ip: bool, suspicious: bool, transaction: Transaction):
+        """IP address messages (a missing IP history adds risk but no message)"""
+        if new_ip:
+            factors.append(f"New IP address detected: {transaction.ip_address}")
+        if suspicious:
+            factors.append(f"Suspicious IP address pattern detected: {transaction.ip_address}")
+    
+    def _payment_factors(self, factors: List[str], level: int):
+        """Payment method messages for a PAYMENT_* level"""
+        if level == PAYMENT_HIGH_VALUE_WALLET:
+            factors.append("High-value wallet transaction")
+        elif level == PAYMENT_SMALL_NET_BANKING:
+            factors.append("Unusually small net banking transaction")
+    
+    def _merchant_factors(self, factors: List[str], high_risk: bool, low_risk: bool, transaction: Transaction):
+        """Merchant category messages"""
+        if high_risk:
+            factors.append(f"High-risk merchant category: {transaction.merchant_category}")
+        if low_risk:
+            factors.append(f"Known low-risk merchant category: {transaction.merchant_category}")
+    
+    def _time_factors(self, factors: List[str], hour: int):
+        """Time pattern message for an off-peak hour"""
+        factors.append(f"Unusual transaction time: {hour:02d}:00 (off-peak hours)")
     
     def _is_suspicious_ip(self, ip_address: str) -> bool:
-        """Check if IP address is suspicious (simplified check)"""
-        # In production, integrate with IP reputation services
-        # For now, check for common patterns
-        if not ip_address:
-            return False
-        
-        # Check for private/local IPs used in suspicious contexts
-        if ip_address.startswith('192.168.') or ip_address.startswith('10.'):
-            return False  # These are usually legitimate
-        
-        # You could add more sophisticated checks here
-        return False
+        """Check if IP address is suspicious (longest-prefix match against the reputation table)"""
+        # In production, feed the table from IP reputation services
+        return self.ip_reputation.is_suspicious(ip_address)
     
     def _generate_reasoning(self, risk_factors: List[str], risk_score: int, transaction: Transaction) -> str:
         """Generate human-readable reasoning for the fraud assessment"""
@@ -333,8 +646,8 @@ class FraudDetectionEngine:
     def _recommend_action(self, risk_score: int) -> str:
         """Recommend action based on risk score"""
         if risk_score >= self.FRAUD_THRESHOLD:
-            return "Block transaction immediately"
+            return self._BLOCK
         elif risk_score >= self.REVIEW_THRESHOLD:
-            return "Flag for review"
+            return self._REVIEW
         else:
-            return "Allow transaction"
+            return self._ALLOW
@@ -0,0 +1,123 @@
+"""
+IP Reputation - Classifies IP addresses against known network ranges
+Uses longest-prefix matching so the most specific listed network decides
+"""
+
+import ipaddress
+from typing import Dict, Iterable, Optional
+
+try:
+    import pytricia
+except ImportError:  # pytricia is optional; fall back to per-prefix-length hash tables
+    pytricia = None
+
+
+# Private/local ranges are usually legitimate
+PRIVATE_NETWORKS = ("10.0.0.0/8", "192.168.0.0/16")
+
+# Upper bound on memoized fallback lookups before the memo is reset
+LOOKUP_CACHE_SIZE = 65536
+
+
+class IPReputationTable:
+    """Maps IP networks to a suspicious flag and looks addresses up by longest prefix"""
+    
+    def __init__(self, suspicious_networks: Optional[Iterable[str]] = None):
+        self._entries: Dict[str, bool] = {}  # Network -> flag, one entry per network
+        self._suspicious_count = 0
+        self._build()
+        
+        for network in PRIVATE_NETWORKS:
+            self.add(network, False)
+        for network in suspicious_networks or ():
+            self.add(network, True)
+    
+    @classmethod
+    def from_file(cls, path: str) -> "IPReputationTable":
+        """Load a blocklist file with one CIDR network per line ('#' starts a comment)"""
+        with open(path, 'r') as f:
+            networks = [line.split('#', 1)[0].strip() for line in f]
+        return cls(network for network in networks if network)
+    
+    def add(self, network: str, suspicious: bool):
+        """Add or replace a network entry"""
+        parsed = ipaddress.ip_network(network, strict=False)
+        key = str(parsed)
+        
+        previous = self._entries.get(key)
+        self._entries[key] = suspicious
+        self._suspicious_count += bool(suspicious) - bool(previous)
+        
+        if pytricia is not None:
+            trie = self._v6 if parsed.version == 6 else self._v4
+            trie[key] = suspicious
+        else:
+            # One table per prefix length, keyed by the network address as an int
+            tables = self._tables[parsed.version]
+            mask = int(parsed.netmask)
+            for table_mask, table in tables:
+                if table_mask == mask:
+                    break
+            else:
+                table = {}
+                tables.append((mask, table))
+                # Longest prefix (largest mask) first, so the first hit is the most specific
+                tables.sort(key=lambda entry: entry[0], reverse=True)
+            table[int(parsed.network_address)] = suspicious
+            self._cache.clear()
+    
+    def is_suspicious(self, ip_address: str) -> bool:
+        """Return the flag of the longest matching network; unlisted or invalid addresses are not suspicious"""
+        # Without any suspicious network every lookup would come back False
+        if not ip_address or not self._suspicious_count:
+            return False
+        
+        if pytricia is not None:
+            trie = self._v6 if ':' in ip_address else self._v4
+            try:
+                return trie.get(ip_address, False)
+            except ValueError:
+                return False  # Not a valid IP address
+        
+        # The same addresses recur across a user's transactions, so fallback lookups are memoized
+        suspicious = self._cache.get(ip_address)
+        if suspicious is None:
+            suspicious = self._lookup(ip_address)
+            if len(self._cache) >= LOOKUP_CACHE_SIZE:
+                self._cache.clear()
+            self._cache[ip_address] = suspicious
+        return suspicious
+    
+    def _lookup(self, ip_address: str) -> bool:
+        """Longest-prefix match over the per-prefix-length tables (fallback without pytricia)"""
+        try:
+            address = ipaddress.ip_address(ip_address)
+        except ValueError:
+            return False  # Not a valid IP address
+        
+        value = int(address)
+        for mask, table in self._tables[address.version]:
+            suspicious = table.get(value & mask)
+            if suspicious is not None:
+                return suspicious
+        return False
+    
+    def _build(self):
+        """Create the empty lookup structures"""
+        if pytricia is not None:
+            self._v4 = pytricia.PyTricia(32)
+            self._v6 = pytricia.PyTricia(128)
+        else:
+            self._tables = {4: [], 6: []}  # Version -> [(netmask as int, {network address as int: flag})]
+            self._cache: Dict[str, bool] = {}
+    
+    def __getstate__(self):
+        # pytricia tries cannot be pickled; ship the entries and rebuild instead
+        return list(self._entries.items())
+    
+    def __setstate__(self, entries):
+        self._entries = {}
+        self._suspicious_count = 0
+        self._build()
+        for network, suspicious in entries:
+            self.add(network, suspicious)
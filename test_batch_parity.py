@@ -0,0 +1,178 @@
+"""
+Batch Parity Tests - Keeps the vectorized batch path in sync with the per-transaction analyzers
+Run with: python -m unittest test_batch_parity
+"""
+
+import random
+import unittest
+from typing import Dict, List
+
+from ip_reputation import IPReputationTable
+from transaction_processor import TransactionProcessor, VECTORIZE_MIN_BATCH
+
+
+LOCATIONS = ["Mumbai, India", "Delhi, India", "London, UK", "New York, USA", "Moscow, Russia", "Lagos", "", "  "]
+CATEGORIES = ["Retail", "groceries", "Online Gambling", "CRYPTOCURRENCY", "Adult Content", "Gambling Retail",
+              "Restaurant", "Travel", "cash advance", ""]
+PAYMENT_METHODS = ["UPI", "Card", "Net Banking", "net banking", "Wallet", "WALLET", ""]
+DEVICES = ["mobile", "web", "tablet"]
+IPS = ["10.0.0.5", "192.168.1.20", "185.220.101.7", "185.220.5.9", "45.33.2.1", "8.8.8.8",
+       "2001:db8::1", "not-an-ip", ""]
+TIMESTAMPS = ["2024-03-01T03:15:00Z", "2024-03-01T05:59:59+05:30", "2024-03-01T02:00:00",
+              "2024-03-01T14:30:00Z", "2024-03-01T23:00:00Z", "not a timestamp", "", "2024-13-45T99:00:00Z"]
+
+
+def generate_transactions(count: int, seed: int = 7) -> List[Dict]:
+    """Generate transaction dictionaries covering every rule branch and awkward inputs"""
+    rng = random.Random(seed)
+    transactions = []
+    
+    for i in range(count):
+        avg = rng.choice([0, 0.0, 50.0, 200.0, 1000.0, 2500.0])
+        amount = rng.choice([
+            avg * 3, avg * 2, avg * 0.1,  # Exactly on the amount boundaries
+            rng.uniform(0, 10000), 1000, 1000.01, 5000, 5000.5, 99.99, 100, 0
+        ])
+        data = {
+            "transaction_id": f"TXN{i:05d}",
+            "user_id": f"USER{rng.randrange(40)}",
+            "amount": rng.choice([amount, str(amount), int(amount)]),
+            "currency": "INR",
+            "transaction_time": rng.choice(TIMESTAMPS),
+            "merchant_name": "Merchant",
+            "merchant_category": rng.choice(CATEGORIES),
+            "payment_method": rng.choice(PAYMENT_METHODS),
+            "user_location": rng.choice(LOCATIONS),
+            "merchant_location": rng.choice(LOCATIONS),
+            "device_type": rng.choice(DEVICES),
+            "ip_address": rng.choice(IPS),
+            "transaction_frequency_24h": rng.choice([0, 1, 4, 5, 9, 10, 25, "5", "12"]),
+            "avg_user_transaction_amount": rng.choice([avg, str(avg)]),
+            "user_international_history": rng.choice([True, False, None])
+        }
+        
+        # Histories may be missing, None, empty or populated
+        for key, values in (("user_device_history", DEVICES),
+                            ("user_location_history", LOCATIONS),
+                            ("user_ip_history", IPS)):
+            choice = rng.randrange(4)
+            if choice == 1:
+                data[key] = None
+            elif choice == 2:
+                data[key] = []
+            elif choice == 3:
+                data[key] = rng.sample(values, rng.randint(1, 3))
+        
+        transactions.append(data)
+    
+    return transactions
+
+
+class BatchParityTest(unittest.TestCase):
+    """analyze_batch must return exactly what analyze_transaction returns"""
+    
+    @classmethod
+    def setUpClass(cls):
+        cls.processor = TransactionProcessor()
+        cls.processor.engine.ip_reputation = IPReputationTable(["185.220.0.0/16", "2001:db8::/32"])
+        cls.processor.engine.ip_reputation.add("185.220.5.0/24", False)
+        cls.transactions = generate_transactions(5000)
+        cls.expected = [cls.processor.process_transaction(data) for data in cls.transactions]
+    
+    def test_batch_matches_single(self):
+        results = self.processor.process_transactions_batch(self.transactions, with_reasoning=True)
+        self.assertEqual(len(results), len(self.expected))
+        for result, expected in zip(results, self.expected):
+            self.assertEqual(result, expected)
+    
+    def test_batch_without_reasoning(self):
+        results = self.processor.process_transactions_batch(self.transactions)
+        for result, expected in zip(results, self.expected):
+            self.assertNotIn("reasoning", result)
+            self.assertEqual(result, {k: v for k, v in expected.items() if k != "reasoning"})
+    
+    def test_small_batches_match_single(self):
+        # Sizes on both sides of the threshold, through the dispatching and the always-vectorized entry points
+        for size in (1, 2, VECTORIZE_MIN_BATCH - 1, VECTORIZE_MIN_BATCH, VECTORIZE_MIN_BATCH + 1):
+            transactions, expected = self.transactions[:size], self.expected[:size]
+            with self.subTest(size=size):
+                self.assertEqual(self.processor.process_transactions_batch(transactions, with_reasoning=True),
+                                 expected)
+                self.assertEqual(self.processor.process_transactions_batch_vectorized(transactions,
+                                                                                      with_reasoning=True),
+                                 expected)
+    
+    def test_chunked_iteration_matches_single(self):
+        results = list(self.processor.process_transactions_iter(self.transactions, chunk_size=97,
+                                                                with_reasoning=True))
+        self.assertEqual(results, self.expected)
+    
+    def test_fast_mode_keeps_verdict(self):
+        for data, expected in zip(self.transactions, self.expected):
+            result = self.processor.process_transaction(data, fast=True)
+            self.assertEqual(result["fraud_status"], expected["fraud_status"])
+    
+    def test_raw_history_values(self):
+        # Histories that cannot become frozensets keep their plain membership semantics
+        base = dict(self.transactions[0], device_type="mobile", ip_address="8.8.8.8")
+        cases = [
+            dict(base, user_device_history="mobile"),        # Substring check: known device
+            dict(base, user_device_history=[["mobile"]]),    # Unhashable items: list scan, new device
+            dict(base, user_device_history=("web", "mobile"), user_ip_history=[{"ip": "8.8.8.8"}]),
+            # Unhashable values checked against frozenset histories are new
+            dict(base, device_type=["mobile"], user_device_history=["mobile"], user_location=[],
+                 user_location_history=["Mumbai, India"], ip_address=[], user_ip_history=["8.8.8.8"]),
+        ]
+        expected = [self.processor.process_transaction(data) for data in cases]
+        self.assertNotIn("New device type detected: mobile", expected[0]["risk_factors"])
+        self.assertIn("New device type detected: mobile", expected[1]["risk_factors"])
+        self.assertNotIn("New device type detected: mobile", expected[2]["risk_factors"])
+        self.assertIn("New device type detected: ['mobile']", expected[3]["risk_factors"])
+        self.assertEqual(self.processor.process_transactions_batch_vectorized(cases, with_reasoning=True), expected)
+    
+    def test_non_string_timestamps_skip_time_check(self):
+        base = dict(self.transactions[0])
+        cases = [dict(base, transaction_time=value) for value in (["2024-03-01T03:00:00Z"], {"t": 1}, 3, None)]
+        expected = [self.processor.process_transaction(data) for data in cases]
+        for result in expected:
+            self.assertFalse(any("Unusual transaction time" in factor for factor in result["risk_factors"]))
+        self.assertEqual(self.processor.process_transactions_batch_vectorized(cases, with_reasoning=True), expected)
+    
+    def test_non_string_locations_have_no_country(self):
+        base = dict(self.transactions[0], user_location_history=None)
+        cases = [dict(base, user_location=value, merchant_location=value) for value in ([], {}, 3, None)]
+        cases.append(dict(base, user_location=[], merchant_location="London, UK"))
+        expected = [self.processor.process_transaction(data) for data in cases]
+        for result in expected:
+            self.assertFalse(any("International transaction" in factor for factor in result["risk_factors"]))
+        self.assertEqual(self.processor.process_transactions_batch_vectorized(cases, with_reasoning=True), expected)
+    
+    def test_unhashable_user_ids(self):
+        # The per-user history cache is skipped for ids it cannot hash
+        cases = [dict(data, user_id=[data["user_id"]]) for data in self.transactions[:VECTORIZE_MIN_BATCH]]
+        cases += [dict(data, user_id={"id": 1}) for data in self.transactions[:2]]
+        expected = [self.processor.process_transaction(data) for data in cases]
+        self.assertEqual(self.processor.process_transactions_batch(cases, with_reasoning=True), expected)
+        self.assertEqual(self.processor.process_transactions_batch(cases[:3], with_reasoning=True), expected[:3])
+    
+    def test_out_of_range_frequencies(self):
+        # Counts beyond int64 must not fail the vectorized path
+        cases = [dict(data, transaction_frequency_24h=value)
+                 for data, value in zip(self.transactions, (10 ** 30, -10 ** 30, 2 ** 63, -2 ** 63 - 1))]
+        expected = [self.processor.process_transaction(data) for data in cases]
+        self.assertEqual(self.processor.process_transactions_batch_vectorized(cases, with_reasoning=True), expected)
+    
+    def test_every_rule_branch_is_covered(self):
+        # Guards the generator: parity is only meaningful if each rule fires somewhere
+        factors = " ".join(factor for result in self.expected for factor in result["risk_factors"])
+        for fragment in ("Amount spike", "Above-average amount", "Unusually small amount",
+                         "High-value first transaction", "Abnormal frequency", "Elevated frequency",
+                         "International transaction without history", "(no history available)",
+                         "New location", "New device", "No device history", "New IP",
+                         "Suspicious IP", "High-value wallet", "small net banking",
+                         "High-risk merchant", "low-risk merchant", "Unusual transaction time"):
+            self.assertIn(fragment, factors)
+
+
+if __name__ == '__main__':
+    unittest.main()
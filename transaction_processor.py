@@ -2,23 +2,38 @@
 Transaction Processor - Handles input/output and processes transactions
 """
 
-import json
-from typing import Dict, List, Optional
+import orjson
+import os
+from collections import deque
+from concurrent.futures import Executor
+from typing import Collection, Dict, Iterator, List, Optional, Tuple
 from fraud_detection_engine import FraudDetectionEngine, Transaction
+from ip_reputation import IPReputationTable
+
+
+# Batches smaller than this are analyzed one transaction at a time: building the
+# NumPy columns costs more than it saves until a batch has a few dozen rows
+VECTORIZE_MIN_BATCH = 32
 
 
 class TransactionProcessor:
     """Processes transaction data and generates fraud detection results"""
     
-    def __init__(self):
-        self.engine = FraudDetectionEngine()
+    def __init__(self, ip_blocklist: Optional[str] = None):
+        """
+        Args:
+            ip_blocklist: Optional path to a file of suspicious CIDR networks, one per line
+        """
+        self.engine = FraudDetectionEngine(ip_blocklist)
     
-    def process_transaction(self, transaction_data: Dict) -> Dict:
+    def process_transaction(self, transaction_data: Dict, with_reasoning: bool = True, fast: bool = False) -> Dict:
         """
         Process a single transaction from dictionary input
         
         Args:
             transaction_data: Dictionary containing transaction fields
+            with_reasoning: Include the human-readable reasoning text
+            fast: Stop analyzing once the transaction is known to be fraudulent
             
         Returns:
             Fraud detection result in specified format
@@ -27,32 +42,127 @@ class TransactionProcessor:
         transaction = self._dict_to_transaction(transaction_data)
         
         # Analyze transaction
-        result = self.engine.analyze_transaction(transaction)
+        result = self.engine.analyze_transaction(transaction, with_reasoning, fast)
         
         return result
     
-    def process_transactions_batch(self, transactions: List[Dict]) -> List[Dict]:
+    def process_transactions_batch(self, transactions: List[Dict], with_reasoning: bool = False) -> List[Dict]:
         """
         Process multiple transactions
         
+        Batches of at least VECTORIZE_MIN_BATCH transactions use the engine's
+        vectorized scorer; smaller ones are analyzed one at a time.
+        
         Args:
             transactions: List of transaction dictionaries
+            with_reasoning: Include the reasoning text (off by default for batches)
             
         Returns:
             List of fraud detection results
         """
-        results = []
-        for transaction_data in transactions:
-            result = self.process_transaction(transaction_data)
-            results.append(result)
-        return results
+        return self._analyze_chunk(transactions, with_reasoning, {})
+    
+    def process_transactions_batch_vectorized(self, transactions: List[Dict], with_reasoning: bool = False) -> List[Dict]:
+        """
+        Process multiple transactions with the engine's vectorized batch scorer
+        
+        Always vectorized, whatever the batch size; process_transactions_batch
+        picks the faster path for small batches.
+        
+        Args:
+            transactions: List of transaction dictionaries
+            with_reasoning: Include the reasoning text (off by default for batches)
+            
+        Returns:
+            List of fraud detection results, in input order
+        """
+        # Transactions from the same user usually carry the same history lists,
+        # so their frozensets are built once per user instead of once per record
+        history_cache = {}
+        return self.engine.analyze_batch([self._dict_to_transaction(data, history_cache) for data in transactions],
+                                         with_reasoning)
+    
+    def process_transactions_iter(self, transactions: List[Dict], chunk_size: int = 1024,
+                                  with_reasoning: bool = False, executor: Optional[Executor] = None,
+                                  max_pending: Optional[int] = None) -> Iterator[Dict]:
+        """
+        Lazily process transactions in vectorized chunks
+        
+        Without an executor only one chunk of results is held in memory at a
+        time, so callers can stream results out as they are produced. With an
+        executor (e.g. a ProcessPoolExecutor) the chunks are analyzed in
+        parallel and yielded back in order, with at most max_pending chunks
+        submitted but not yet yielded; only the plain chunk lists are sent
+        to the workers, which analyze them with their own processor. Create the
+        pool with initializer=init_worker and initargs=self.worker_initargs()
+        so the workers score exactly like this processor.
+        
+        Args:
+            transactions: List of transaction dictionaries
+            chunk_size: Number of transactions analyzed per vectorized batch
+            with_reasoning: Include the reasoning text (off by default for batches)
+            executor: Optional executor to analyze chunks on
+            max_pending: Chunks in flight on the executor (default: twice the CPU count)
+            
+        Yields:
+            Fraud detection results, in input order
+        """
+        chunks = (transactions[start:start + chunk_size] for start in range(0, len(transactions), chunk_size))
+        
+        if executor is not None:
+            # Bounded window: the next chunk is submitted as each finished one is yielded,
+            # so memory does not grow with the size of the batch
+            max_pending = max_pending or 2 * (os.cpu_count() or 1)
+            pending = deque()
+            try:
+                for chunk in chunks:
+                    pending.append(executor.submit(_process_chunk, chunk, with_reasoning))
+                    if len(pending) >= max_pending:
+                        yield from pending.popleft().result()
+                while pending:
+                    yield from pending.popleft().result()
+            finally:
+                # Consumer stopped early (e.g. client disconnected); drop the queued work
+                for future in pending:
+                    future.cancel()
+            return
+        
+        history_cache = {}
+        for chunk in chunks:
+            yield from self._analyze_chunk(chunk, with_reasoning, history_cache)
+    
+    def _analyze_chunk(self, transactions: List[Dict], with_reasoning: bool, history_cache: Dict) -> List[Dict]:
+        """Analyze transactions, vectorized only when there are at least VECTORIZE_MIN_BATCH of them"""
+        if len(transactions) < VECTORIZE_MIN_BATCH:
+            return [self.engine.analyze_transaction(self._dict_to_transaction(data, history_cache), with_reasoning)
+                    for data in transactions]
+        return self.engine.analyze_batch([self._dict_to_transaction(data, history_cache) for data in transactions],
+                                         with_reasoning)
+    
+    def worker_initargs(self) -> Tuple:
+        """
+        Arguments for init_worker that configure a worker's engine like this one
+        
+        The configuration is copied when the executor starts its workers; later
+        changes to this processor's engine do not reach them.
+        
+        Returns:
+            Tuple of (IP reputation table, {threshold attribute: value})
+        """
+        engine = self.engine
+        return engine.ip_reputation, {name: getattr(engine, name) for name in engine.THRESHOLD_SETTINGS}
     
-    def _dict_to_transaction(self, data: Dict) -> Transaction:
+    def _dict_to_transaction(self, data: Dict, history_cache: Optional[Dict] = None) -> Transaction:
         """Convert dictionary to Transaction object"""
+        device_history, location_history, ip_history = self._user_histories(data, history_cache)
+        # Parsed JSON usually has the right numeric types already; only cast otherwise
+        amount = data.get("amount", 0)
+        frequency = data.get("transaction_frequency_24h", 0)
+        avg_amount = data.get("avg_user_transaction_amount", 0)
         return Transaction(
             transaction_id=data.get("transaction_id", ""),
             user_id=data.get("user_id", ""),
-            amount=float(data.get("amount", 0)),
+            amount=amount if type(amount) is float else float(amount),
             currency=data.get("currency", "USD"),
             transaction_time=data.get("transaction_time", ""),
             merchant_name=data.get("merchant_name", ""),
@@ -62,20 +172,91 @@ class TransactionProcessor:
             merchant_location=data.get("merchant_location", ""),
             device_type=data.get("device_type", ""),
             ip_address=data.get("ip_address", ""),
-            transaction_frequency_24h=int(data.get("transaction_frequency_24h", 0)),
-            avg_user_transaction_amount=float(data.get("avg_user_transaction_amount", 0)),
-            user_device_history=data.get("user_device_history"),
-            user_location_history=data.get("user_location_history"),
-            user_ip_history=data.get("user_ip_history"),
+            transaction_frequency_24h=frequency if type(frequency) is int else int(frequency),
+            avg_user_transaction_amount=avg_amount if type(avg_amount) is float else float(avg_amount),
+            user_device_history=device_history,
+            user_location_history=location_history,
+            user_ip_history=ip_history,
             user_international_history=data.get("user_international_history")
         )
     
+    def _user_histories(self, data: Dict, history_cache: Optional[Dict] = None) -> Tuple[Optional[Collection[str]], ...]:
+        """
+        Build the device, location and IP history sets for a transaction
+        
+        Histories become frozensets where possible so membership checks are O(1). With a
+        history_cache (keyed by user_id), the sets built for the user's previous
+        transaction are reused when the raw history lists are unchanged.
+        """
+        raw = (data.get("user_device_history"), data.get("user_location_history"), data.get("user_ip_history"))
+        
+        if history_cache is not None:
+            user_id = data.get("user_id", "")
+            try:
+                cached = history_cache.get(user_id)
+            except TypeError:
+                cached = history_cache = None  # Unhashable user_id; build the sets without the cache
+            if cached is not None and cached[0] == raw:
+                return cached[1]
+        
+        histories = tuple(self._history_set(history) for history in raw)
+        if history_cache is not None:
+            history_cache[user_id] = (raw, histories)
+        return histories
+    
+    def _history_set(self, history: Optional[List[str]]) -> Optional[Collection[str]]:
+        """
+        Convert a history list to a frozenset, None if empty or missing
+        
+        Other values (a bare string, or a list with unhashable items) are kept
+        as given, so membership checks behave exactly as they would on the raw input.
+        """
+        if not history:
+            return None
+        if isinstance(history, (list, tuple)):
+            try:
+                return frozenset(history)
+            except TypeError:
+                pass  # Unhashable items; fall back to scanning the list
+        return history
+    
     def format_output(self, result: Dict) -> str:
         """Format result as JSON string"""
-        return json.dumps(result, indent=2)
+        return orjson.dumps(result, option=orjson.OPT_INDENT_2).decode()
     
     def save_results(self, results: List[Dict], filename: str = "fraud_detection_results.json"):
         """Save results to JSON file"""
-        with open(filename, 'w') as f:
-            json.dump(results, f, indent=2)
+        with open(filename, 'wb') as f:
+            f.write(orjson.dumps(results, option=orjson.OPT_INDENT_2))
         print(f"Results saved to {filename}")
+
+
+# Per-process TransactionProcessor used by executor workers
+_WORKER_PROCESSOR: Optional[TransactionProcessor] = None
+
+
+def init_worker(ip_reputation: Optional[IPReputationTable] = None, thresholds: Optional[Dict] = None):
+    """
+    Executor initializer that builds the worker's TransactionProcessor once
+    
+    Use as ProcessPoolExecutor(initializer=init_worker, initargs=processor.worker_initargs())
+    so chunks submitted by process_transactions_iter never have to carry a
+    pickled processor, and the worker's engine is configured like the caller's.
+    
+    Args:
+        ip_reputation: IP reputation table for the worker's engine (default: private ranges only)
+        thresholds: Engine threshold attributes to override
+    """
+    global _WORKER_PROCESSOR
+    _WORKER_PROCESSOR = TransactionProcessor()
+    if ip_reputation is not None:
+        _WORKER_PROCESSOR.engine.ip_reputation = ip_reputation
+    for name, value in (thresholds or {}).items():
+        setattr(_WORKER_PROCESSOR.engine, name, value)
+
+
+def _process_chunk(chunk: List[Dict], with_reasoning: bool) -> List[Dict]:
+    """Analyze one chunk on an executor worker"""
+    if _WORKER_PROCESSOR is None:
+        init_worker()  # Executor created without the initializer
+    return _WORKER_PROCESSOR.process_transactions_batch(chunk, with_reasoning)
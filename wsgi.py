@@ -0,0 +1,14 @@
+"""
+WSGI entry point for running the Fraud Detection API under a production server
+(the built-in Flask server started by app.py is for development only)
+
+Example:
+    WEB_CONCURRENCY=$(nproc) gunicorn -k gthread --threads 8 wsgi:app
+
+Each server process also starts a pool of FRAUD_POOL_WORKERS processes for
+large /api/analyze-batch requests. The default is the CPU count divided by
+WEB_CONCURRENCY, so set the gunicorn worker count through WEB_CONCURRENCY
+rather than -w to keep the total number of busy processes at the core count.
+"""
+
+from app import app